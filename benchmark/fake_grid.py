@@ -0,0 +1,122 @@
+import json
+import time
+import uuid
+import threading
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from benchmark.fake_waitrose import FakeWaitrose
+
+ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+
+class FakeGridNode:
+    # Speaks just enough of the W3C WebDriver protocol for SessionPool and ProductScraper.
+    # Navigation renders the product page straight from the fake site, after `latency` seconds
+    def __init__(self, site: FakeWaitrose, latency: float = 0.5, session_latency: float = 1.0) -> None:
+        self.site = site
+        self.latency = latency
+        self.session_latency = session_latency
+        self.sessions_created = 0
+        self.navigations = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, value: any, status: int = 200) -> None:
+                data = json.dumps({"value": value}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> dict:
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length)) if length else {}
+
+            def _session(self, parts):
+                session = node._sessions.get(parts[1]) if len(parts) > 1 else None
+                if session is None:
+                    self._send({"error": "invalid session id", "message": "No such session", "stacktrace": ""}, 404)
+                return session
+
+            def do_POST(self) -> None:
+                parts = urlparse(self.path).path.strip("/").split("/")
+                body = self._body()
+
+                if parts == ["session"]:
+                    time.sleep(node.session_latency)
+                    session_id = uuid.uuid4().hex
+                    with node._lock:
+                        node._sessions[session_id] = {"url": "about:blank"}
+                        node.sessions_created += 1
+                    self._send({"sessionId": session_id, "capabilities": {"browserName": "chrome", "pageLoadStrategy": "eager"}})
+                    return
+
+                session = self._session(parts)
+                if session is None:
+                    return
+
+                command = "/".join(parts[2:])
+                if command == "url":
+                    path = urlparse(body["url"]).path
+                    node.site.record_request(path)
+                    time.sleep(node.latency)
+                    session["url"] = body["url"]
+                    with node._lock:
+                        node.navigations += 1
+                    self._send(None)
+                elif command == "element":
+                    self._send({ELEMENT_KEY: uuid.uuid4().hex})
+                elif command == "goog/cdp/execute":
+                    self._send({})
+                else:
+                    self._send(None)
+
+            def do_GET(self) -> None:
+                parts = urlparse(self.path).path.strip("/").split("/")
+                if parts == ["status"]:
+                    self._send({"ready": True, "message": "Stub Grid node"})
+                    return
+
+                session = self._session(parts)
+                if session is None:
+                    return
+
+                command = "/".join(parts[2:])
+                if command == "url":
+                    self._send(session["url"])
+                elif command == "source":
+                    product_id = urlparse(session["url"]).path.rstrip("/").split("/")[-1]
+                    self._send(node.site.product_page(product_id, rendered=True))
+                else:
+                    self._send(None)
+
+            def do_DELETE(self) -> None:
+                parts = urlparse(self.path).path.strip("/").split("/")
+                with node._lock:
+                    node._sessions.pop(parts[1] if len(parts) > 1 else None, None)
+                self._send(None)
+
+        return Handler
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import threading
+from typing import List, Dict
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name)) as file:
+        return file.read()
+
+def render_fixture(template: str, product: Dict[str, any], page_kb: int) -> str:
+    padding = "var __STATE__ = \"" + "x" * max(0, page_kb * 1024 - len(template)) + "\";"
+    return template.replace("{name}", product["name"]).replace("{id}", product["id"]).replace("{padding}", padding)
+
+class Catalogue:
+    # A synthetic category tree: one root with leaf subcategories, where every
+    # `shared_every`-th product is also listed in the next category
+    root: str
+    categories: Dict[str, List[Dict[str, any]]]
+    products: Dict[str, Dict[str, any]]
+
+    def __init__(self, product_count: int, category_count: int, root: str = "10051", shared_every: int = 10) -> None:
+        self.root = root
+        self.categories = {f"{root}{index:03}": [] for index in range(category_count)}
+        self.products = {}
+        category_ids = list(self.categories.keys())
+
+        for index in range(product_count):
+            category_id = category_ids[index % category_count]
+            product = {
+                "id": f"{index:06}-{index * 7 % 99991}",
+                "name": f"Waitrose Benchmark Product {index}",
+                "size": "500g",
+                "displayPrice": f"£{1 + index % 9}.{index % 100:02}",
+                "displayPriceQualifier": f"(£{2 + index % 7}.00/kg)",
+                "reviews": { "averageRating": index % 5 + 0.5, "reviewCount": index % 40 },
+                "categories": [{ "id": category_id, "name": f"Category {category_id}" }],
+                "productTags": [{ "name": "Vegetarian" }] if index % 3 == 0 else [],
+                "productImageUrls": { "large": f"https://example.invalid/images/{index}.jpg" }
+            }
+            self.products[product["id"]] = product
+            self.categories[category_id].append(product)
+            if shared_every and index % shared_every == 0:
+                self.categories[category_ids[(index + 1) % category_count]].append(product)
+
+    def list_page(self, category: str, start: int, size: int) -> Dict[str, any]:
+        if category == self.root:
+            products = list(self.products.values())
+            sub_categories = [
+                { "name": f"Category {category_id}", "categoryId": category_id, "expectedResults": len(category_products), "hiddenInNav": False }
+                for category_id, category_products in self.categories.items()
+            ]
+        else:
+            products = self.categories.get(category, [])
+            sub_categories = []
+
+        return {
+            "data": {
+                "getProductListPage": {
+                    "productGridData": {
+                        "componentsAndProducts": [
+                            { "__typename": "GridProduct", "searchProduct": product }
+                            for product in products[start:start + size]
+                        ],
+                        "subCategories": sub_categories,
+                        "totalMatches": len(products)
+                    }
+                }
+            }
+        }
+
+class FakeWaitrose:
+    # Serves the GraphQL listing at /graphql and product pages at /ecom/products/<slug>/<id>.
+    # Every `fallback_every`-th product page comes without its sections, as a client-rendered
+    # page would, so it has to go through the (stub) Grid
+    def __init__(self, catalogue: Catalogue, latency: float = 0.0, page_kb: int = 200, fallback_every: int = 10) -> None:
+        self.catalogue = catalogue
+        self.latency = latency
+        self.page_kb = page_kb
+        self.fallback_every = fallback_every
+        self.first_requested: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._rendered = load_fixture("product.html")
+        self._unrendered = load_fixture("product_unrendered.html")
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def record_request(self, path: str) -> None:
+        with self._lock:
+            self.first_requested.setdefault(path, time.monotonic())
+
+    def product_page(self, product_id: str, rendered: bool) -> str:
+        product = self.catalogue.products[product_id]
+        needs_browser = self.fallback_every and int(product_id.split("-")[0]) % self.fallback_every == 0
+        template = self._unrendered if needs_browser and not rendered else self._rendered
+        return render_fixture(template, product, self.page_kb)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, body: str, content_type: str) -> None:
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self) -> None:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                variables = payload["variables"]
+                time.sleep(fake.latency)
+                page = fake.catalogue.list_page(variables["category"], variables["start"], variables["size"])
+                self._send(200, json.dumps(page), "application/json")
+
+            def do_GET(self) -> None:
+                path = urlparse(self.path).path
+                product_id = path.rstrip("/").split("/")[-1]
+                if not path.startswith("/ecom/products/") or product_id not in fake.catalogue.products:
+                    self._send(404, "Not found", "text/plain")
+                    return
+                fake.record_request(path)
+                time.sleep(fake.latency)
+                self._send(200, fake.product_page(product_id, rendered=False), "text/html; charset=utf-8")
+
+        return Handler
@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import resource
+import tempfile
+import threading
+from typing import List
+from urllib.parse import urlparse
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from metrics import percentile
+from benchmark.fake_grid import FakeGridNode
+from benchmark.fake_waitrose import Catalogue, FakeWaitrose
+
+def write_settings(work_dir: str, site: FakeWaitrose, nodes: List[FakeGridNode], capacity: int) -> None:
+    # Start from the real settings so the benchmark measures the current tuning
+    with open(os.path.join(REPO_DIR, "settings.json")) as file:
+        settings = json.load(file)
+
+    settings["SELENIUM_SERVERS"] = [{"IP": "127.0.0.1", "PORT": str(node.port), "CAPACITY": capacity} for node in nodes]
+    settings["WAITROSE"] = {"GRAPHQL_URL": f"{site.url}/graphql", "PRODUCTS_URL": f"{site.url}/ecom/products"}
+    settings["CRAWL"] = {"ROOT_CATEGORIES": [site.catalogue.root]}
+    settings.setdefault("STORE", {})["PATH"] = os.path.join(work_dir, "waitrose_products.db")
+    settings.setdefault("JOURNAL", {})["PATH"] = os.path.join(work_dir, "waitrose_runs.db")
+    settings.setdefault("OUTPUT", {})["PATH"] = os.path.join(work_dir, "waitrose_products")
+
+    with open(os.path.join(work_dir, "settings.json"), "w") as file:
+        json.dump(settings, file, indent=4)
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    catalogue = Catalogue(args.products, args.categories)
+    site = FakeWaitrose(catalogue, args.site_latency, args.page_kb, args.fallback_every)
+    nodes = [FakeGridNode(site, args.grid_latency, args.session_latency) for _ in range(args.grid_nodes)]
+    site.start()
+    for node in nodes:
+        node.start()
+
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            write_settings(work_dir, site, nodes, args.capacity)
+
+            # config.py reads settings.json from the working directory on import
+            os.chdir(work_dir)
+            import waitrose_scraper
+
+            latencies = []
+            lock = threading.Lock()
+            write_product = waitrose_scraper.ProductScraper.write_product
+
+            def timed_write_product(self, row):
+                # From the first request for the page (HTTP or browser) to the row being handed to the writer
+                requested = site.first_requested.get(urlparse(row["product_url"]).path)
+                if requested is not None:
+                    with lock:
+                        latencies.append(time.monotonic() - requested)
+                write_product(self, row)
+
+            waitrose_scraper.ProductScraper.write_product = timed_write_product
+
+            started = time.monotonic()
+            waitrose_scraper.run_waitrose_scraper()
+            elapsed = time.monotonic() - started
+            stages = waitrose_scraper.metrics.summary()["stages"]
+
+            waitrose_scraper.ProductScraper.write_product = write_product
+    finally:
+        os.chdir(cwd)
+        for node in nodes:
+            node.stop()
+        site.stop()
+
+    return {
+        "products": len(catalogue.products),
+        "scraped": len(latencies),
+        "browser_navigations": sum(node.navigations for node in nodes),
+        "browser_sessions": sum(node.sessions_created for node in nodes),
+        "elapsed_seconds": round(elapsed, 3),
+        "products_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_p50_seconds": round(percentile(sorted(latencies), 50), 4),
+        "latency_p99_seconds": round(percentile(sorted(latencies), 99), 4),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_memory_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_parser_memory_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "stages": stages
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of run_waitrose_scraper")
+    parser.add_argument("--products", type=int, default=2000, help="products in the synthetic catalogue")
+    parser.add_argument("--categories", type=int, default=20, help="leaf categories under the root")
+    parser.add_argument("--page-kb", type=int, default=200, help="size of each product page")
+    parser.add_argument("--fallback-every", type=int, default=10, help="every Nth product page needs a browser, 0 for none")
+    parser.add_argument("--site-latency", type=float, default=0.02, help="seconds per listing or product page request")
+    parser.add_argument("--grid-nodes", type=int, default=3, help="stub Selenium Grid nodes")
+    parser.add_argument("--capacity", type=int, default=2, help="browser sessions per Grid node")
+    parser.add_argument("--grid-latency", type=float, default=0.5, help="seconds per browser navigation")
+    parser.add_argument("--session-latency", type=float, default=1.0, help="seconds to start a browser session")
+    parser.add_argument("--log-level", default="WARNING", help="log level of the scraper while benchmarking")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="[%(asctime)s] %(message)s", level=args.log_level.upper())
+
+    report = run_benchmark(args)
+    print(json.dumps(report, indent=4))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver import Remote
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+
+# Only the server-rendered markup matters, so skip everything else
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.css"
+]
+
+HEALTH_CHECK_INTERVAL = 30
+
+def lean_chrome_options() -> webdriver.ChromeOptions:
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.page_load_strategy = "eager"
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.stylesheets": 2
+    })
+    return chrome_options
+
+class PooledSession:
+    driver: Remote
+    pages: int
+    last_used: float
+
+    def __init__(self, driver: Remote) -> None:
+        self.driver = driver
+        self.pages = 0
+        self.last_used = time.monotonic()
+
+class SessionPool:
+    _server_url: str
+    _max_pages: int
+    _page_load_timeout: float
+    _idle: "queue.LifoQueue[PooledSession]"
+    _slots: threading.BoundedSemaphore
+
+    def __init__(self, server_url: str, size: int = 2, max_pages: int = 50, page_load_timeout: float = 30) -> None:
+        self._server_url = server_url
+        self._max_pages = max_pages
+        self._page_load_timeout = page_load_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max(1, size))
+        self._closed = False
+
+    @property
+    def server_url(self) -> str:
+        return self._server_url
+
+    def _create_session(self) -> PooledSession:
+        connection = ChromiumRemoteConnection(self._server_url, "google", "chrome")
+        driver = Remote(connection, options=lean_chrome_options())
+        driver.set_page_load_timeout(self._page_load_timeout)
+        try:
+            driver.execute("executeCdpCommand", {"cmd": "Network.enable", "params": {}})
+            driver.execute("executeCdpCommand", {"cmd": "Network.setBlockedURLs", "params": {"urls": BLOCKED_URLS}})
+        except Exception as e:
+            logging.info(f"Could not block resources on {self._server_url}: {str(e)}")
+        return PooledSession(driver)
+
+    def _is_healthy(self, session: PooledSession) -> bool:
+        if time.monotonic() - session.last_used < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            session.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, session: PooledSession) -> None:
+        try:
+            session.driver.quit()
+        except Exception:
+            pass
+
+    def _checkout(self) -> PooledSession:
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return self._create_session()
+            if self._is_healthy(session):
+                return session
+            self._quit(session)
+
+    def _checkin(self, session: PooledSession, failed: bool) -> None:
+        session.pages += 1
+        session.last_used = time.monotonic()
+        if failed or self._closed or session.pages >= self._max_pages:
+            self._quit(session)
+        else:
+            self._idle.put(session)
+
+    @contextmanager
+    def session(self):
+        self._slots.acquire()
+        session = None
+        failed = False
+        try:
+            session = self._checkout()
+            yield session.driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if session is not None:
+                self._checkin(session, failed)
+            self._slots.release()
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
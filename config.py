@@ -1,9 +1,75 @@
+import os
 import json
 
 try:
     with open("settings.json") as file:
         data = json.load(file)
-        SELENIUM_SERVERS = [f"http://{SELENIUM_SERVER['IP']}:{SELENIUM_SERVER['PORT']}" for SELENIUM_SERVER in data["SELENIUM_SERVERS"]]
+except Exception:
+    data = {}
+
+WAITROSE = data.get("WAITROSE", {})
+WAITROSE_GRAPHQL_URL = WAITROSE.get("GRAPHQL_URL", "https://www.waitrose.com/api/graphql-prod/graph/live")
+WAITROSE_PRODUCTS_URL = WAITROSE.get("PRODUCTS_URL", "https://www.waitrose.com/ecom/products")
+
+LISTING = data.get("LISTING", {})
+LISTING_CONCURRENCY = int(LISTING.get("CONCURRENCY", 8))
+LISTING_PAGE_SIZE = int(LISTING.get("PAGE_SIZE", 80))
+LISTING_RETRIES = int(LISTING.get("RETRIES", 3))
+LISTING_BACKOFF = float(LISTING.get("BACKOFF", 0.5))
+
+HTTP = data.get("HTTP", {})
+HTTP_ENABLED = bool(HTTP.get("ENABLED", True))
+HTTP_CONCURRENCY = int(HTTP.get("CONCURRENCY", 16))
+HTTP_TIMEOUT = float(HTTP.get("TIMEOUT", 30))
+HTTP_RETRIES = int(HTTP.get("RETRIES", 2))
+
+SESSIONS = data.get("SESSIONS", {})
+SESSIONS_PER_SERVER = int(SESSIONS.get("PER_SERVER", 2))
+SESSION_MAX_PAGES = int(SESSIONS.get("MAX_PAGES", 50))
+SESSION_PAGE_LOAD_TIMEOUT = float(SESSIONS.get("PAGE_LOAD_TIMEOUT", 30))
+SESSION_WAIT_TIMEOUT = float(SESSIONS.get("WAIT_TIMEOUT", 10))
+
+try:
+    SELENIUM_SERVERS = [f"http://{SELENIUM_SERVER['IP']}:{SELENIUM_SERVER['PORT']}" for SELENIUM_SERVER in data["SELENIUM_SERVERS"]]
+    SELENIUM_SERVER_CAPACITIES = {
+        f"http://{SELENIUM_SERVER['IP']}:{SELENIUM_SERVER['PORT']}": int(SELENIUM_SERVER.get("CAPACITY", SESSIONS_PER_SERVER))
+        for SELENIUM_SERVER in data["SELENIUM_SERVERS"]
+    }
 except Exception:
     SELENIUM_SERVERS = []
-    
\ No newline at end of file
+    SELENIUM_SERVER_CAPACITIES = {}
+
+SCHEDULER = data.get("SCHEDULER", {})
+SCHEDULER_MAX_ATTEMPTS = int(SCHEDULER.get("MAX_ATTEMPTS", 3))
+SCHEDULER_UNHEALTHY_AFTER = int(SCHEDULER.get("UNHEALTHY_AFTER", 5))
+
+OUTPUT = data.get("OUTPUT", {})
+OUTPUT_FORMATS = [str(output_format).lower() for output_format in OUTPUT.get("FORMATS", ["csv"])]
+OUTPUT_PATH = OUTPUT.get("PATH", "waitrose_products")
+OUTPUT_PRICES_PATH = OUTPUT.get("PRICES_PATH", f"{OUTPUT_PATH}_prices") # The prices job never overwrites the full run's export
+OUTPUT_BATCH_SIZE = int(OUTPUT.get("BATCH_SIZE", 500))
+OUTPUT_FLUSH_INTERVAL = float(OUTPUT.get("FLUSH_INTERVAL", 5))
+
+STORE = data.get("STORE", {})
+STORE_PATH = STORE.get("PATH", "waitrose_products.db")
+STORE_TTL_HOURS = float(STORE.get("TTL_HOURS", 168))
+STORE_OUTPUT = str(STORE.get("OUTPUT", "snapshot")).lower()
+
+JOURNAL = data.get("JOURNAL", {})
+JOURNAL_PATH = JOURNAL.get("PATH", "waitrose_runs.db")
+
+CRAWL = data.get("CRAWL", {})
+CRAWL_ROOT_CATEGORIES = [str(category) for category in CRAWL.get("ROOT_CATEGORIES", ["10051"])]
+
+PARSER = data.get("PARSER", {})
+PARSER_WORKERS = int(PARSER.get("WORKERS", 0)) # 0 uses one worker per core
+
+METRICS = data.get("METRICS", {})
+METRICS_SUMMARY_PATH = METRICS.get("SUMMARY_PATH", "waitrose_metrics.json")
+METRICS_PRICES_SUMMARY_PATH = METRICS.get("PRICES_SUMMARY_PATH", "{0}_prices{1}".format(*os.path.splitext(METRICS_SUMMARY_PATH)))
+METRICS_PORT = int(METRICS.get("PORT", 0)) # 0 disables the Prometheus endpoint
+METRICS_HOST = METRICS.get("HOST", "127.0.0.1") # "0.0.0.0" serves every interface
+
+SCHEDULE = data.get("SCHEDULE", {})
+SCHEDULE_OVERLAP = str(SCHEDULE.get("OVERLAP", "queue")).lower() # "queue" or "skip"
+SCHEDULE_RELOAD_INTERVAL = float(SCHEDULE.get("RELOAD_INTERVAL", 60))
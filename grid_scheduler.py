@@ -0,0 +1,204 @@
+import time
+import queue
+import logging
+import threading
+from metrics import metrics
+from typing import List, Dict, Tuple, Callable, Set, Optional
+from concurrent.futures import Future
+from browser_pool import SessionPool
+from selenium.webdriver import Remote
+
+class Task:
+    product: Dict[str, any]
+    attempts: int
+    tried_servers: Set[str]
+
+    def __init__(self, product: Dict[str, any]) -> None:
+        self.product = product
+        self.attempts = 0
+        self.tried_servers = set()
+
+class ProductError(Exception):
+    # Raised by handlers when the product itself cannot be scraped (bad page or listing data),
+    # so the node is not to blame and another node would fail the same way
+    pass
+
+class NodeStats:
+    completed: int
+    failed: int
+    busy_time: float
+    consecutive_failures: int
+    healthy: bool
+
+    def __init__(self) -> None:
+        self.completed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.consecutive_failures = 0
+        self.healthy = True
+
+class GridScheduler:
+    _session_pools: List[SessionPool]
+    _capacities: Dict[str, int]
+    _handler: Callable[[Dict[str, any], Remote], Optional[Future]]
+    _max_attempts: int
+    _unhealthy_after: int
+
+    def __init__(self,
+                 session_pools: List[SessionPool],
+                 capacities: Dict[str, int],
+                 handler: Callable[[Dict[str, any], Remote], Optional[Future]],
+                 max_attempts: int = 3,
+                 unhealthy_after: int = 5) -> None:
+        # Servers configured with no capacity get no workers, so they must not hold back retries either
+        self._session_pools = [session_pool for session_pool in session_pools if capacities.get(session_pool.server_url, 1) > 0]
+        self._capacities = capacities
+        self._handler = handler
+        self._max_attempts = max(1, max_attempts)
+        self._unhealthy_after = max(1, unhealthy_after)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._deferred = 0
+        self._settled = threading.Condition(self._lock)
+        self._failures = []
+        self._stats = {session_pool.server_url: NodeStats() for session_pool in self._session_pools}
+
+    def _has_untried_node(self, task: Task) -> bool:
+        with self._lock:
+            return any(stats.healthy and server_url not in task.tried_servers for server_url, stats in self._stats.items())
+
+    def _on_success(self, server_url: str, stats: NodeStats, elapsed: float) -> None:
+        metrics.increment("products", node=server_url, status="completed")
+        with self._lock:
+            stats.completed += 1
+            stats.busy_time += elapsed
+            stats.consecutive_failures = 0
+            self._pending -= 1
+
+    def _on_failure(self, server_url: str, stats: NodeStats, task: Task, error: Exception, elapsed: float) -> None:
+        if isinstance(error, ProductError):
+            self._on_product_failure(server_url, task, error)
+            return
+
+        task.attempts += 1
+        task.tried_servers.add(server_url)
+        reason = f"{type(error).__name__}: {str(error)}"
+        metrics.increment("products", node=server_url, status="failed")
+        metrics.increment("exceptions", node=server_url, type=type(error).__name__)
+        logging.info(f"Product {task.product['id']} failed on {server_url} (attempt {task.attempts}): {reason}")
+
+        with self._lock:
+            stats.failed += 1
+            stats.busy_time += elapsed
+            stats.consecutive_failures += 1
+            if stats.healthy and stats.consecutive_failures >= self._unhealthy_after:
+                stats.healthy = False
+                logging.info(f"Marking {server_url} unhealthy after {stats.consecutive_failures} consecutive failures")
+
+            if task.attempts >= self._max_attempts:
+                self._failures.append((task.product, reason))
+                self._pending -= 1
+                return
+
+        # Retried products go to the back of the queue, where another node will pick them up
+        self._queue.put(task)
+
+    def _on_product_failure(self, server_url: str, task: Task, error: ProductError) -> None:
+        # Failed straight away and kept out of the node's health
+        reason = str(error)
+        metrics.increment("products", node=server_url, status="failed")
+        metrics.increment("exceptions", node=server_url, type=type(error).__name__)
+        logging.info(f"Product {task.product['id']} cannot be scraped: {reason}")
+
+        with self._lock:
+            self._failures.append((task.product, reason))
+            self._pending -= 1
+
+    def _on_deferred(self, server_url: str, stats: NodeStats, task: Task, future: Future, elapsed: float) -> None:
+        # Handlers that finish the product after releasing the session report back through a future
+        error = future.exception()
+        if error is None:
+            self._on_success(server_url, stats, elapsed)
+        else:
+            self._on_failure(server_url, stats, task, error, elapsed)
+        with self._lock:
+            self._deferred -= 1
+            self._settled.notify_all()
+
+    def _worker(self, session_pool: SessionPool) -> None:
+        server_url = session_pool.server_url
+        stats = self._stats[server_url]
+
+        while True:
+            with self._lock:
+                if self._pending == 0 or not stats.healthy:
+                    return
+            try:
+                task = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            if server_url in task.tried_servers and self._has_untried_node(task):
+                self._queue.put(task)
+                time.sleep(0.05)
+                continue
+
+            started = time.monotonic()
+            try:
+                with session_pool.session() as driver:
+                    metrics.observe("session_acquire", time.monotonic() - started)
+                    result = self._handler(task.product, driver)
+            except Exception as e:
+                self._on_failure(server_url, stats, task, e, time.monotonic() - started)
+                continue
+
+            elapsed = time.monotonic() - started
+            if isinstance(result, Future):
+                with self._lock:
+                    self._deferred += 1
+                result.add_done_callback(lambda result, task=task, elapsed=elapsed: self._on_deferred(server_url, stats, task, result, elapsed))
+            else:
+                self._on_success(server_url, stats, elapsed)
+
+    def _report(self, elapsed: float) -> None:
+        for server_url, stats in self._stats.items():
+            throughput = stats.completed / elapsed * 60 if elapsed > 0 else 0
+            average = stats.busy_time / (stats.completed + stats.failed) if stats.completed + stats.failed else 0
+            logging.info(
+                f"{server_url}: {stats.completed} completed, {stats.failed} failed, "
+                f"{throughput:.1f} products/min, {average:.2f}s per product"
+                f"{'' if stats.healthy else ' (unhealthy)'}")
+
+    def run(self, products: List[Dict[str, any]]) -> List[Tuple[Dict[str, any], str]]:
+        # Returns the products that could not be scraped, with the last error
+        for product in products:
+            self._queue.put(Task(product))
+        self._pending = len(products)
+
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=self._worker, args=(session_pool,), daemon=True)
+            for session_pool in self._session_pools
+            for _ in range(self._capacities.get(session_pool.server_url, 1))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Deferred failures may still requeue their product
+        with self._lock:
+            self._settled.wait_for(lambda: self._deferred == 0)
+
+        # Anything left means every node went unhealthy
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._failures.append((task.product, "No healthy Selenium Grid servers"))
+
+        self._report(time.monotonic() - started)
+
+        return self._failures
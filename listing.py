@@ -0,0 +1,212 @@
+import json
+import time
+import logging
+import requests
+from tqdm import tqdm
+from typing import List, Dict, Set, Tuple
+from metrics import metrics
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+GRAPHQL_URL = "https://www.waitrose.com/api/graphql-prod/graph/live"
+
+# Only the fields read by ProductScraper and the category crawl are requested
+LISTING_QUERY = """query(
+  $customerId: String!
+  $size: Int
+  $start: Int
+  $category: String
+  $filterTags: [filterTag]
+  $sortBy: String
+  $trolleyId: String
+  $withFallback: Boolean
+) {
+  getProductListPage(
+    category: $category
+    customerId: $customerId
+    filterTags: $filterTags
+    size: $size
+    start: $start
+    sortBy: $sortBy
+    trolleyId: $trolleyId
+    withFallback: $withFallback
+  ) {
+    productGridData {
+      componentsAndProducts {
+        __typename
+        ... on GridProduct {
+          searchProduct {
+            id
+            name
+            size
+            displayPrice
+            displayPriceQualifier
+            reviews {
+              averageRating
+              reviewCount
+            }
+            categories {
+              id
+              name
+            }
+            productTags {
+              name
+            }
+            productImageUrls {
+              large
+            }
+          }
+        }
+      }
+      subCategories {
+        name
+        categoryId
+        expectedResults
+        hiddenInNav
+      }
+      totalMatches
+    }
+  }
+}
+"""
+
+DEFAULT_VARIABLES = {
+    "sortBy": "MOST_POPULAR",
+    "trolleyId": "0",
+    "withFallback": True,
+    "customerId": "-1",
+    "filterTags": []
+}
+
+class ListingFetcher:
+    _session: requests.Session
+    _concurrency: int
+    _page_size: int
+    _retries: int
+    _backoff: float
+    _url: str
+
+    def __init__(self, concurrency: int = 8, page_size: int = 80, retries: int = 3, backoff: float = 0.5, url: str = GRAPHQL_URL) -> None:
+        self._concurrency = max(1, concurrency)
+        self._page_size = page_size
+        self._retries = retries
+        self._backoff = backoff
+        self._url = url
+
+        # One keep-alive pool shared by every page request
+        self._session = requests.Session()
+        self._session.headers.update({"Authorization": "Bearer unauthenticated"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._concurrency)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def close(self) -> None:
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def fetch_page(self, category: str, start: int, size: int) -> Dict[str, any]:
+        payload = {
+            "query": LISTING_QUERY,
+            "variables": {**DEFAULT_VARIABLES, "category": category, "start": start, "size": size}
+        }
+
+        for attempt in range(self._retries + 1):
+            # Only the successful attempt is timed, backoff and failed attempts show up as retries
+            started = time.perf_counter()
+            try:
+                response = self._session.post(self._url, json=payload, timeout=30)
+                response.raise_for_status()
+                content = json.loads(response.content)
+                grid_data = content["data"]["getProductListPage"]["productGridData"]
+                metrics.observe("listing_fetch", time.perf_counter() - started)
+                return grid_data
+            except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+                if attempt == self._retries:
+                    metrics.increment("exceptions", node="listing", type=type(e).__name__)
+                    raise
+                metrics.increment("retries", node="listing")
+                delay = self._backoff * (2 ** attempt)
+                logging.info(f"Listing page {category}:{start} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    @staticmethod
+    def get_page_products(grid_data: Dict[str, any]) -> List[any]:
+        return [
+            product["searchProduct"]
+            for product in grid_data["componentsAndProducts"]
+            if product["__typename"] == "GridProduct"
+        ]
+
+    @staticmethod
+    def merge_products(products: Dict[str, any], page_products: List[any]) -> None:
+        # Products listed in several categories are kept once, with their categories merged.
+        # Categories are sorted so the listing hash does not depend on which page finished first
+        for product in page_products:
+            existing = products.get(product["id"])
+            if existing is None:
+                product["categories"] = sorted(product["categories"] or [], key=lambda category: category["id"])
+                products[product["id"]] = product
+                continue
+            known_categories = {category["id"] for category in existing["categories"]}
+            existing["categories"] = sorted(existing["categories"] + [
+                category for category in product["categories"] or []
+                if category["id"] not in known_categories
+            ], key=lambda category: category["id"])
+
+    def crawl(self, root_categories: List[str]) -> Tuple[List[any], int]:
+        # Returns the unique products and how many listing pages could not be fetched
+        products: Dict[str, any] = {}
+        visited: Set[str] = set(root_categories)
+        failed_pages = 0
+
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor, tqdm(unit="page") as progress:
+            futures = {
+                executor.submit(self.fetch_page, category, 0, self._page_size): (category, 0)
+                for category in root_categories
+            }
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    category, start = futures.pop(future)
+                    progress.update()
+                    try:
+                        grid_data = future.result()
+                    except Exception as e:
+                        # A failed first page loses the whole subtree, so the listing is incomplete either way
+                        failed_pages += 1
+                        metrics.increment("listing_failures")
+                        logging.info(f"Failed to list category {category} page {start}: {str(e)}")
+                        continue
+
+                    self.merge_products(products, self.get_page_products(grid_data))
+
+                    if start != 0:
+                        continue
+
+                    # Parent listings repeat their children's products, so only leaf categories are paged.
+                    # Subcategories the listing reports as empty are not fetched at all
+                    sub_categories = [
+                        sub_category["categoryId"] for sub_category in grid_data.get("subCategories") or []
+                        if sub_category.get("expectedResults") != 0 and sub_category["categoryId"] not in visited
+                    ]
+                    visited.update(sub_categories)
+
+                    if sub_categories:
+                        for sub_category in sub_categories:
+                            futures[executor.submit(self.fetch_page, sub_category, 0, self._page_size)] = (sub_category, 0)
+                    else:
+                        for page_start in range(self._page_size, grid_data.get("totalMatches") or 0, self._page_size):
+                            futures[executor.submit(self.fetch_page, category, page_start, self._page_size)] = (category, page_start)
+
+                    progress.set_postfix(categories=len(visited), products=len(products))
+
+        if failed_pages:
+            logging.info(f"Listing is incomplete, {failed_pages} pages could not be fetched")
+
+        return list(products.values()), failed_pages
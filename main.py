@@ -1,37 +1,133 @@
+import os
 import sys
 import logging
 import asyncio
 import logging.handlers
-from datetime import datetime
-from waitrose_scraper import run_waitrose_scraper
+from collections import deque
+from datetime import datetime, timedelta
+from typing import List, Optional
+from config import SCHEDULE_OVERLAP, SCHEDULE_RELOAD_INTERVAL
+from waitrose_scraper import run_waitrose_scraper, refresh_waitrose_prices
+
+JOBS = {
+    "full": run_waitrose_scraper,
+    "prices": refresh_waitrose_prices
+}
+
+class Schedule():
+    # "HH:MM" runs daily, "*:MM" runs hourly at that minute
+    def __init__(self, hour: Optional[int], minute: int, job: str):
+        self.hour = hour
+        self.minute = minute
+        self.job = job
+
+    def next_run(self, after: datetime) -> datetime:
+        if self.hour is None:
+            candidate = after.replace(minute=self.minute, second=0, microsecond=0)
+            return candidate if candidate > after else candidate + timedelta(hours=1)
+        candidate = after.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        return candidate if candidate > after else candidate + timedelta(days=1)
+
+    def __repr__(self) -> str:
+        return f"{'*' if self.hour is None else f'{self.hour:02}'}:{self.minute:02} {self.job}"
 
 class Watcher():
-    def __init__(self):
-        self._last_check = datetime.now()
+    def __init__(self, path: str = "watcher.txt"):
+        self._path = path
+        self._mtime = None
+        self._schedules = []
 
-    def get_scheduled_time(self) -> datetime:
-        with open("watcher.txt", "rt") as fp:
-            parts = fp.read().strip().split(':')
-        now = datetime.now()
-        return datetime(now.year, now.month, now.day, int(parts[0]), int(parts[1]), 0)
+    @staticmethod
+    def parse_schedule(line: str) -> Schedule:
+        parts = line.split()
+        job = parts[1] if len(parts) > 1 else "full"
+        if job not in JOBS:
+            raise ValueError(f"unknown job '{job}'")
+        hour, minute = parts[0].split(':')
+        hour = None if hour == '*' else int(hour)
+        minute = int(minute)
+        if hour is not None and not 0 <= hour < 24:
+            raise ValueError(f"hour {hour} out of range")
+        if not 0 <= minute < 60:
+            raise ValueError(f"minute {minute} out of range")
+        return Schedule(hour, minute, job)
 
-    def check_schedule(self) -> bool:
-        rtime = self.get_scheduled_time()
-        now = datetime.now()
-        
-        if self._last_check < rtime and now > rtime:
-            self._last_check = now
-            return True
-        
-        return False
-
-async def run():
+    def get_schedules(self) -> List[Schedule]:
+        # watcher.txt is only re-read when it changes
+        try:
+            mtime = os.stat(self._path).st_mtime
+        except OSError as e:
+            logging.warning(f"Cannot read {self._path}: {str(e)}")
+            return self._schedules
+        if mtime == self._mtime:
+            return self._schedules
+
+        schedules = []
+        with open(self._path, "rt") as fp:
+            for line in fp:
+                line = line.split('#')[0].strip()
+                if not line:
+                    continue
+                try:
+                    schedules.append(self.parse_schedule(line))
+                except ValueError as e:
+                    logging.warning(f"Ignoring schedule '{line}': {str(e)}")
+
+        self._mtime = mtime
+        self._schedules = schedules
+        logging.info(f"Loaded schedules: {', '.join(map(repr, schedules)) or 'none'}")
+        return schedules
+
+class JobRunner():
+    # Runs one job at a time off the event loop; triggers that fire meanwhile are skipped or queued
+    def __init__(self, overlap: str = "queue"):
+        self._overlap = overlap
+        self._queue = deque()
+        self._running = None
+
+    @property
+    def busy(self) -> bool:
+        return self._running is not None
+
+    def trigger(self, job: str):
+        if self._running is None:
+            self._running = asyncio.ensure_future(self._run(job))
+        elif self._overlap == "skip":
+            logging.info(f"Skipping {job} run, previous run still in progress")
+        elif job in self._queue:
+            logging.info(f"{job} run already queued")
+        else:
+            logging.info(f"Queueing {job} run until the previous run finishes")
+            self._queue.append(job)
+
+    async def _run(self, job: str):
+        loop = asyncio.get_running_loop()
+        while job is not None:
+            logging.info(f"Starting {job} run")
+            try:
+                await loop.run_in_executor(None, JOBS[job])
+            except Exception as e:
+                logging.warning(f"Exception: {str(e)}")
+            job = self._queue.popleft() if self._queue else None
+        self._running = None
+
+async def run(runner: JobRunner):
     watcher = Watcher()
+    last_check = datetime.now()
+
     while True:
-        if watcher.check_schedule():
-            run_waitrose_scraper()
+        schedules = watcher.get_schedules()
+        now = datetime.now()
+
+        for schedule in schedules:
+            if schedule.next_run(last_check) <= now:
+                runner.trigger(schedule.job)
+        last_check = now
 
-        await asyncio.sleep(0.5)
+        # Sleep until the next schedule is due, waking up in between only to notice edits to watcher.txt
+        next_run = min((schedule.next_run(now) for schedule in schedules), default=None)
+        delay = SCHEDULE_RELOAD_INTERVAL if next_run is None else min((next_run - now).total_seconds(), SCHEDULE_RELOAD_INTERVAL)
+        await asyncio.sleep(max(delay, 0))
 
 def main(log_to_file: bool = False):
     if log_to_file:
@@ -56,16 +152,27 @@ def main(log_to_file: bool = False):
     
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
+    runner = JobRunner(SCHEDULE_OVERLAP)
+    interrupted = False
 
     try:
-        loop.run_until_complete(run())
+        loop.run_until_complete(run(runner))
     except KeyboardInterrupt:
+        interrupted = runner.busy
         logging.info("Quitting Waitrose Scraper...")
+        if interrupted:
+            logging.info("Abandoning the run in progress, continue it with: python3 waitrose_scraper.py --resume")
     except Exception as e:
         logging.warning(f"Exception: {str(e)}")
     finally:
         logging.info("Waitrose Scraper: Finished!")
-        
+
+    if interrupted:
+        # The job's executor thread cannot be cancelled and would keep the interpreter alive
+        # until the run finished, so exit straight away; the run journal allows resuming it
+        logging.shutdown()
+        os._exit(130)
+
     loop.close()
     asyncio.set_event_loop(None)
 
@@ -0,0 +1,137 @@
+import json
+import time
+import logging
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+def percentile(values: List[float], percent: float) -> float:
+    # Expects values sorted in ascending order
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+class Metrics:
+    _durations: Dict[str, List[float]]
+    _counters: Counter
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._durations = defaultdict(list)
+            self._counters = Counter()
+            self._started_at = time.time()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._durations[stage].append(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def increment(self, name: str, amount: int = 1, **labels: str) -> None:
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def _snapshot(self) -> Tuple[Dict[str, List[float]], Counter]:
+        with self._lock:
+            return {stage: sorted(durations) for stage, durations in self._durations.items()}, Counter(self._counters)
+
+    def summary(self) -> Dict[str, any]:
+        durations, counters = self._snapshot()
+        finished_at = time.time()
+
+        nodes = defaultdict(lambda: {"completed": 0, "failed": 0, "exceptions": {}})
+        for (name, labels), value in counters.items():
+            labels = dict(labels)
+            if name == "products":
+                nodes[labels["node"]][labels["status"]] = nodes[labels["node"]].get(labels["status"], 0) + value
+            elif name == "exceptions":
+                nodes[labels["node"]]["exceptions"][labels["type"]] = value
+
+        return {
+            "started_at": self._started_at,
+            "finished_at": finished_at,
+            "elapsed_seconds": round(finished_at - self._started_at, 3),
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "total_seconds": round(sum(values), 3),
+                    "mean_seconds": round(sum(values) / len(values), 4),
+                    "p50_seconds": round(percentile(values, 50), 4),
+                    "p95_seconds": round(percentile(values, 95), 4),
+                    "p99_seconds": round(percentile(values, 99), 4),
+                    "max_seconds": round(values[-1], 4)
+                }
+                for stage, values in durations.items() if values
+            },
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            "nodes": dict(nodes)
+        }
+
+    def write_summary(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=4)
+
+    def prometheus(self) -> str:
+        durations, counters = self._snapshot()
+        lines = []
+
+        lines.append("# TYPE waitrose_stage_seconds summary")
+        for stage, values in durations.items():
+            for quantile in (0.5, 0.95, 0.99):
+                lines.append(f'waitrose_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {percentile(values, quantile * 100)}')
+            lines.append(f'waitrose_stage_seconds_sum{{stage="{stage}"}} {sum(values)}')
+            lines.append(f'waitrose_stage_seconds_count{{stage="{stage}"}} {len(values)}')
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE waitrose_{name}_total counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels)
+                    lines.append(f"waitrose_{name}_total{{{label_text}}} {value}")
+
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+_server: Optional[ThreadingHTTPServer] = None
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> None:
+    # Serves the current run's metrics at /metrics; started once per process
+    global _server
+    if _server is not None or not port:
+        return
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            data = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    _server = ThreadingHTTPServer((host, port), Handler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    logging.info(f"Serving metrics on {host}:{port}")
@@ -0,0 +1,173 @@
+import csv
+import json
+import time
+import queue
+import logging
+import threading
+from metrics import metrics
+from typing import List, Dict
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+FIELDNAMES = [
+    'id',
+    'source',
+    'title', 
+    'description',
+    'item_price',
+    'unit_price',
+    'average_rating',
+    'review_count',
+    'categories',
+    'tags',
+    'nutrition',
+    'product_url',
+    'image_url',
+    'size',
+    'last_updated' 
+]
+
+class CsvSink:
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDNAMES)
+        self._writer.writeheader()
+
+    def write_rows(self, rows: List[Dict[str, any]]) -> None:
+        self._writer.writerows([{**row, 'nutrition': json.dumps(row['nutrition'])} for row in rows])
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+class JsonLinesSink:
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'w')
+
+    def write_rows(self, rows: List[Dict[str, any]]) -> None:
+        self._file.writelines([json.dumps(row) + '\n' for row in rows])
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+class ParquetSink:
+    def __init__(self, path: str) -> None:
+        if pa is None:
+            raise RuntimeError("pyarrow is required for the parquet output format")
+
+        # Each nutrition column (per 100g, per serving, ...) is a map of nutrient to value
+        self._schema = pa.schema([
+            (field, pa.float64()) if field == 'average_rating' else
+            (field, pa.int64()) if field == 'review_count' else
+            (field, pa.struct([('values', pa.list_(pa.map_(pa.string(), pa.string())))])) if field == 'nutrition' else
+            (field, pa.string())
+            for field in FIELDNAMES
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write_rows(self, rows: List[Dict[str, any]]) -> None:
+        columns = {field: [row.get(field) for row in rows] for field in FIELDNAMES}
+        columns['nutrition'] = [
+            {'values': [list(values.items()) for values in row['nutrition']['values']]}
+            for row in rows
+        ]
+        self._writer.write_table(pa.table(columns, schema=self._schema))
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._writer.close()
+
+SINKS = {
+    "csv": CsvSink,
+    "jsonl": JsonLinesSink,
+    "parquet": ParquetSink
+}
+
+def create_sinks(formats: List[str], path: str) -> List[any]:
+    return [SINKS[output_format](f"{path}.{output_format}") for output_format in formats]
+
+_STOP = object()
+
+class OutputWriter:
+    _sinks: List[any]
+    _batch_size: int
+    _flush_interval: float
+
+    def __init__(self, sinks: List[any], batch_size: int = 500, flush_interval: float = 5, stage: str = "write") -> None:
+        self._sinks = sinks
+        self._stage = stage
+        self._batch_size = max(1, batch_size)
+        self._flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.written = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def write(self, row: Dict[str, any]) -> None:
+        self._queue.put(row)
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join()
+        for sink in self._sinks:
+            sink.close()
+
+    def _flush(self, batch: List[Dict[str, any]]) -> None:
+        if not batch:
+            return
+        # Sinks run in order and a failure skips the rest of the batch, so a later
+        # sink (such as the run journal) never records rows an earlier one lost
+        with metrics.timer(self._stage):
+            for sink in self._sinks:
+                try:
+                    sink.write_rows(batch)
+                    sink.flush()
+                except Exception as e:
+                    metrics.increment("exceptions", node=self._stage, type=type(e).__name__)
+                    logging.info(f"Exception: {str(e)}")
+                    return
+        metrics.increment("rows", amount=len(batch), stage=self._stage)
+        self.written += len(batch)
+
+    def _run(self) -> None:
+        batch = []
+        last_flush = time.monotonic()
+
+        while True:
+            timeout = max(0, self._flush_interval - (time.monotonic() - last_flush))
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                row = None
+
+            if row is _STOP:
+                self._flush(batch)
+                return
+            if row is not None:
+                batch.append(row)
+
+            if len(batch) >= self._batch_size or time.monotonic() - last_flush >= self._flush_interval:
+                self._flush(batch)
+                batch = []
+                last_flush = time.monotonic()
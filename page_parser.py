@@ -0,0 +1,200 @@
+import os
+import time
+import logging
+import multiprocessing
+import threading
+import lxml.html
+from metrics import metrics
+from collections import Counter
+from typing import List, Dict, Tuple, Callable, Optional
+from concurrent.futures import ProcessPoolExecutor, Future
+
+# Each field is taken from the first rule that matches. Class names are CSS-module
+# hashes (nutrition___VCHp1), so rules match on the stable prefix only
+EXTRACTION_SPEC = {
+    "description": [
+        {"tag": "section", "id": "productDescription"},
+        {"tag": "section", "id": "summary"},
+        {"tag": "section", "id": "marketingDescription"}
+    ],
+    "nutrition": [
+        {"tag": "div", "class_prefix": "nutrition___"}
+    ]
+}
+
+def rule_xpath(rule: Dict[str, str]) -> str:
+    if "id" in rule:
+        return f"//{rule['tag']}[@id='{rule['id']}']"
+    return f"//{rule['tag']}[starts-with(@class, '{rule['class_prefix']}') or contains(@class, ' {rule['class_prefix']}')]"
+
+def rule_css(rule: Dict[str, str]) -> str:
+    if "id" in rule:
+        return f"{rule['tag']}#{rule['id']}"
+    return f"{rule['tag']}[class^='{rule['class_prefix']}'], {rule['tag']}[class*=' {rule['class_prefix']}']"
+
+def spec_css(field: str, suffix: str = "") -> str:
+    return ", ".join(
+        f"{selector}{suffix}"
+        for rule in EXTRACTION_SPEC[field]
+        for selector in rule_css(rule).split(", ")
+    )
+
+def get_text(element: lxml.html.HtmlElement) -> str:
+    # Same as BeautifulSoup's get_text(strip=True)
+    return "".join(text.strip() for text in element.itertext())
+
+def find_first(document: lxml.html.HtmlElement, field: str):
+    for rule in EXTRACTION_SPEC[field]:
+        elements = document.xpath(rule_xpath(rule))
+        if elements:
+            return elements[0]
+    return None
+
+def extract_nutrition(element: lxml.html.HtmlElement) -> Dict[str, any]:
+    nutritions = { "values": [] }
+
+    header = element.xpath(".//thead/tr[1]")
+    if not header:
+        return nutritions
+
+    nutrition_titles = [get_text(cell) for cell in header[0]]
+    # lxml does not insert the implied <tbody> the way html5lib did, so rows are matched with or without one
+    nutrition_rows = element.xpath(".//table//tr[not(ancestor::thead)]")
+
+    for _id, nutrition_title in enumerate(nutrition_titles):
+        if _id == 0: continue
+
+        nutrition = { "unit": nutrition_title }
+
+        for row in nutrition_rows:
+            # Rows with a classed header cell are section headings, not values
+            if row.find("th") is not None and "class" not in row.find("th").attrib:
+                nutrition_cells = list(row)
+                nutrition[get_text(nutrition_cells[0])] = get_text(nutrition_cells[_id])
+
+        nutritions["values"].append(nutrition)
+
+    return nutritions
+
+def parse_page(html: str) -> Tuple[Dict[str, any], List[str]]:
+    # Returns the extracted fields and the fields that could not be extracted
+    document = lxml.html.fromstring(html)
+    missing = []
+
+    description_element = find_first(document, "description")
+    if description_element is None:
+        missing.append("description")
+
+    # Not every product has nutrition, but a container without a readable table is a failure
+    nutritions = { "values": [] }
+    nutrition_element = find_first(document, "nutrition")
+    if nutrition_element is not None:
+        try:
+            nutritions = extract_nutrition(nutrition_element)
+        except IndexError:
+            nutritions = { "values": [] }
+        # A header without any value rows is as unreadable as no table at all
+        if not any(len(nutrition) > 1 for nutrition in nutritions["values"]):
+            missing.append("nutrition")
+
+    return {
+        "description": get_text(description_element) if description_element is not None else '',
+        "nutrition": nutritions
+    }, missing
+
+def timed_parse_page(html: str) -> Tuple[Dict[str, any], List[str], float, Optional[Tuple[str, str]]]:
+    # lxml errors cannot be pickled back from the worker, so failures are returned as (type, message)
+    started = time.perf_counter()
+    try:
+        fields, missing = parse_page(html)
+    except Exception as e:
+        return {}, [], time.perf_counter() - started, (type(e).__name__, str(e))
+    return fields, missing, time.perf_counter() - started, None
+
+class ParserPool:
+    _executor: ProcessPoolExecutor
+    _slots: threading.BoundedSemaphore
+    _missing: Counter
+
+    def __init__(self, workers: int = 0) -> None:
+        workers = workers or os.cpu_count() or 1
+        # Spawned rather than forked, the scraper process is full of threads holding locks
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        # Bounds the raw HTML waiting to be parsed so fetchers slow down instead of buffering
+        self._slots = threading.BoundedSemaphore(workers * 4)
+        self._lock = threading.Lock()
+        self._missing = Counter()
+        self._idle = threading.Condition(self._lock)
+        self._outstanding = 0
+        self.parsed = 0
+        self.failed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def submit(self, html: str, on_parsed: Callable[[Dict[str, any], List[str], Optional[Tuple[str, str]]], None], bounded: bool = True) -> Future:
+        # Callers on an event loop must not block here; they pass bounded=False and
+        # apply back-pressure by awaiting the returned future instead
+        if bounded:
+            self._slots.acquire()
+        with self._lock:
+            self._outstanding += 1
+        try:
+            future = self._executor.submit(timed_parse_page, html)
+        except Exception:
+            if bounded:
+                self._slots.release()
+            with self._lock:
+                self._outstanding -= 1
+                self._idle.notify_all()
+            raise
+        future.add_done_callback(lambda future: self._on_done(future, on_parsed, bounded))
+        return future
+
+    def _on_done(self, future: Future, on_parsed: Callable[[Dict[str, any], List[str], Optional[Tuple[str, str]]], None], bounded: bool) -> None:
+        if bounded:
+            self._slots.release()
+        try:
+            try:
+                fields, missing, elapsed, error = future.result()
+            except Exception as e:
+                # The worker itself died, e.g. a broken process pool
+                fields, missing, elapsed, error = {}, [], 0.0, (type(e).__name__, str(e))
+
+            if error is None:
+                metrics.observe("parse", elapsed)
+                with self._lock:
+                    self.parsed += 1
+                    self._missing.update(missing)
+            else:
+                metrics.increment("exceptions", node="parser", type=error[0])
+                with self._lock:
+                    self.failed += 1
+
+            # Callers decide what a failed parse means for their product
+            on_parsed(fields, missing, error)
+        except Exception as e:
+            logging.info(f"Exception: {str(e)}")
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+                self._idle.notify_all()
+
+    def join(self) -> None:
+        # Waits until every submitted page has been parsed and handled
+        with self._lock:
+            self._idle.wait_for(lambda: self._outstanding == 0)
+
+    def report(self) -> None:
+        for field, count in self._missing.items():
+            logging.info(f"Could not extract {field} from {count} of {self.parsed} pages")
+        if self.failed:
+            logging.info(f"Could not parse {self.failed} pages")
+
+    def close(self) -> None:
+        self.join()
+        self._executor.shutdown(wait=True)
+        self.report()
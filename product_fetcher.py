@@ -0,0 +1,78 @@
+import time
+import asyncio
+import logging
+import aiohttp
+from metrics import metrics
+from typing import List, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor, Future
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-GB,en;q=0.9"
+}
+
+class ProductPageFetcher:
+    _concurrency: int
+    _timeout: float
+    _retries: int
+    _backoff: float
+
+    def __init__(self, concurrency: int = 16, timeout: float = 30, retries: int = 2, backoff: float = 0.5) -> None:
+        self._concurrency = max(1, concurrency)
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
+        for attempt in range(self._retries + 1):
+            # Timed per attempt so backoff sleeps stay out of http_fetch
+            started = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    if response.status == 404:
+                        return None
+                    response.raise_for_status()
+                    html = await response.text()
+                    metrics.observe("http_fetch", time.perf_counter() - started)
+                    return html
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self._retries:
+                    metrics.increment("exceptions", node="http", type=type(e).__name__)
+                    logging.info(f"Failed to fetch {url}: {str(e)}")
+                    return None
+                metrics.increment("retries", node="http")
+                await asyncio.sleep(self._backoff * (2 ** attempt))
+
+    async def _fetch_pages(self, urls: List[str], on_page: Callable[[str, Optional[str]], Optional[Future]]) -> None:
+        semaphore = asyncio.Semaphore(self._concurrency)
+        connector = aiohttp.TCPConnector(limit=self._concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self._timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS) as session:
+            async def fetch(url: str) -> None:
+                # The slot is held until on_page's work is done, so slow parsing slows
+                # fetching down without ever blocking the event loop
+                async with semaphore:
+                    try:
+                        html = await self._fetch(session, url)
+                        pending = on_page(url, html)
+                    except Exception as e:
+                        # e.g. an undecodable body or a broken parser pool; one bad page must not
+                        # cancel the others, so it is handed back as unfetched instead
+                        metrics.increment("exceptions", node="http", type=type(e).__name__)
+                        logging.info(f"Failed to fetch {url}: {str(e)}")
+                        pending = on_page(url, None)
+                    if pending is not None:
+                        try:
+                            await asyncio.wrap_future(pending)
+                        except Exception:
+                            pass
+
+            await asyncio.gather(*[fetch(url) for url in urls])
+
+    def fetch_pages(self, urls: List[str], on_page: Callable[[str, Optional[str]], Optional[Future]]) -> None:
+        # on_page gets None for pages that could not be fetched. Run on a dedicated
+        # thread so this works whether or not the caller is already inside an event loop
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(asyncio.run, self._fetch_pages(urls, on_page)).result()
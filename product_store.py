@@ -0,0 +1,143 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Dict, Tuple, Iterator, Optional
+
+def content_hash(value: any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+class ProductStore:
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: str) -> None:
+        # Rows are saved from the writer thread, everything else from the caller's
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS products (
+                    id TEXT PRIMARY KEY,
+                    listing TEXT NOT NULL,
+                    listing_hash TEXT NOT NULL,
+                    last_seen REAL NOT NULL,
+                    record TEXT,
+                    record_hash TEXT,
+                    scraped_hash TEXT,
+                    scraped_at REAL,
+                    changed_at REAL
+                )
+            """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def plan(self, products: List[Dict[str, any]], ttl: float, seen_at: float) -> List[Dict[str, any]]:
+        # Records the listing snapshot and returns the products whose page must be fetched:
+        # new ones, ones whose listing changed since their last scrape, and stale ones
+        with self._lock, self._connection:
+            self._connection.executemany("""
+                INSERT INTO products (id, listing, listing_hash, last_seen) VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    listing = excluded.listing,
+                    listing_hash = excluded.listing_hash,
+                    last_seen = excluded.last_seen
+            """, [(product["id"], json.dumps(product), content_hash(product), seen_at) for product in products])
+
+            stale_ids = {row[0] for row in self._connection.execute("""
+                SELECT id FROM products
+                WHERE last_seen = ?
+                  AND (record IS NULL OR scraped_hash IS NOT listing_hash OR scraped_at < ?)
+            """, (seen_at, seen_at - ttl))}
+
+        return [product for product in products if product["id"] in stale_ids]
+
+    def load_listings(self, product_ids: List[str]) -> List[Dict[str, any]]:
+        # The stored listing of each product, which a later listing may have updated since it was planned
+        listings = {}
+        with self._lock:
+            # Chunked to stay under SQLite's bound parameter limit
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                listings.update(self._connection.execute(
+                    f"SELECT id, listing FROM products WHERE id IN ({', '.join('?' * len(chunk))})", chunk).fetchall())
+        return [json.loads(listings[product_id]) for product_id in product_ids if product_id in listings]
+
+    def last_listed(self) -> Optional[float]:
+        with self._lock:
+            return self._connection.execute("SELECT MAX(last_seen) FROM products").fetchone()[0]
+
+    def save_records(self, rows: List[Dict[str, any]], scraped: bool = True) -> None:
+        # Records rebuilt from the listing alone (scraped=False) keep their scrape time and
+        # listing hash, so the next full run still fetches their page once it is due
+        scraped_columns = ", scraped_hash = listing_hash, scraped_at = :now" if scraped else ""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(f"""
+                UPDATE products SET
+                    changed_at = CASE WHEN record_hash IS :record_hash THEN changed_at ELSE :now END,
+                    record = :record,
+                    record_hash = :record_hash{scraped_columns}
+                WHERE id = :id
+            """, [
+                {"record_hash": content_hash({**row, "last_updated": None}), "now": now, "record": json.dumps(row), "id": row["id"]}
+                for row in rows
+            ])
+
+    def iter_listed_records(self, seen_at: float) -> Iterator[Tuple[Dict[str, any], Dict[str, any]]]:
+        # The latest listing of each product listed in this run that already has a record
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT listing, record FROM products WHERE last_seen = ? AND record IS NOT NULL ORDER BY rowid", (seen_at,))
+
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for listing, record in rows:
+                yield json.loads(listing), json.loads(record)
+
+    def iter_records(self, seen_at: float, changed_since: Optional[float] = None) -> Iterator[Dict[str, any]]:
+        # Full snapshot of the products listed in this run, or only those that changed
+        query = "SELECT record FROM products WHERE last_seen = ? AND record IS NOT NULL"
+        params = [seen_at]
+        if changed_since is not None:
+            query += " AND changed_at >= ?"
+            params.append(changed_since)
+
+        with self._lock:
+            cursor = self._connection.execute(query + " ORDER BY rowid", params)
+
+        while True:
+            with self._lock:
+                records = cursor.fetchmany(500)
+            if not records:
+                break
+            for (record,) in records:
+                yield json.loads(record)
+
+class StoreSink:
+    _store: ProductStore
+    _scraped: bool
+
+    def __init__(self, store: ProductStore, scraped: bool = True) -> None:
+        self._store = store
+        self._scraped = scraped
+
+    def write_rows(self, rows: List[Dict[str, any]]) -> None:
+        self._store.save_records(rows, self._scraped)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
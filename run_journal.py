@@ -0,0 +1,128 @@
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Dict, Tuple, Optional
+
+class RunJournal:
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: str) -> None:
+        # Completions are recorded from the writer thread, everything else from the caller's
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at REAL NOT NULL,
+                    finished_at REAL,
+                    status TEXT NOT NULL,
+                    listing_failures INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS run_products (
+                    run_id INTEGER NOT NULL,
+                    product_id TEXT NOT NULL,
+                    listing TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    reason TEXT,
+                    PRIMARY KEY (run_id, product_id)
+                )
+            """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def start_run(self, products: List[Dict[str, any]], pending_products: List[Dict[str, any]], started_at: float, listing_failures: int = 0) -> int:
+        # The whole listing snapshot is journalled; products that need no fetch are marked skipped
+        pending_ids = {product["id"] for product in pending_products}
+        with self._lock, self._connection:
+            # Only the latest run can be resumed, so older listing snapshots are no longer needed
+            self._connection.execute("DELETE FROM run_products")
+            run_id = self._connection.execute(
+                "INSERT INTO runs (started_at, status, listing_failures) VALUES (?, 'running', ?)",
+                (started_at, listing_failures)).lastrowid
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO run_products (run_id, product_id, listing, status) VALUES (?, ?, ?, ?)",
+                [
+                    (run_id, product["id"], json.dumps(product), "pending" if product["id"] in pending_ids else "skipped")
+                    for product in products
+                ])
+        return run_id
+
+    def find_resumable_run(self) -> Optional[Tuple[int, float, int]]:
+        # The latest run, if it was interrupted or left failures behind
+        with self._lock:
+            run = self._connection.execute("""
+                SELECT id, started_at, listing_failures FROM runs
+                WHERE status = 'running'
+                   OR EXISTS (
+                       SELECT 1 FROM run_products
+                       WHERE run_id = runs.id AND status IN ('pending', 'failed')
+                   )
+                ORDER BY id DESC LIMIT 1
+            """).fetchone()
+            latest = self._connection.execute("SELECT MAX(id) FROM runs").fetchone()[0]
+        return run if run is not None and run[0] == latest else None
+
+    def load_products(self, run_id: int) -> Tuple[List[Dict[str, any]], List[Dict[str, any]]]:
+        # Returns the listing snapshot and the products that still need to be scraped
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT listing, status FROM run_products WHERE run_id = ? ORDER BY rowid", (run_id,)).fetchall()
+        products = [json.loads(listing) for listing, _ in rows]
+        pending_products = [product for product, (_, status) in zip(products, rows) if status in ("pending", "failed")]
+        return products, pending_products
+
+    def mark_running(self, run_id: int) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE runs SET status = 'running', finished_at = NULL WHERE id = ?", (run_id,))
+
+    def mark_completed(self, run_id: int, product_ids: List[str]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE run_products SET status = 'completed', reason = NULL WHERE run_id = ? AND product_id = ?",
+                [(run_id, product_id) for product_id in product_ids])
+
+    def mark_failed(self, run_id: int, failures: List[Tuple[Dict[str, any], str]]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE run_products SET status = 'failed', reason = ? WHERE run_id = ? AND product_id = ?",
+                [(reason, run_id, product["id"]) for product, reason in failures])
+
+    def finish_run(self, run_id: int) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE runs SET status = 'finished', finished_at = ? WHERE id = ?", (time.time(), run_id))
+            # A run without failures has nothing left to resume
+            self._connection.execute("""
+                DELETE FROM run_products WHERE run_id = ? AND NOT EXISTS (
+                    SELECT 1 FROM run_products WHERE run_id = ? AND status IN ('pending', 'failed')
+                )
+            """, (run_id, run_id))
+
+class JournalSink:
+    _journal: RunJournal
+    _run_id: int
+
+    def __init__(self, journal: RunJournal, run_id: int) -> None:
+        self._journal = journal
+        self._run_id = run_id
+
+    def write_rows(self, rows: List[Dict[str, any]]) -> None:
+        self._journal.mark_completed(self._run_id, [row["id"] for row in rows])
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
@@ -1,222 +1,361 @@
 import re
-import os
-import csv
-import math
-import json
+import argparse
+import time
 import logging
-import requests
-from tqdm import tqdm
-from typing import List
-import multiprocessing as mp
-from bs4 import BeautifulSoup
+from typing import List, Dict, Tuple, Optional
 from datetime import datetime
-from selenium import webdriver
-from config import SELENIUM_SERVERS
+from concurrent.futures import Future
+from listing import ListingFetcher
+from browser_pool import SessionPool
+from product_fetcher import ProductPageFetcher
+from grid_scheduler import GridScheduler, ProductError
+from page_parser import ParserPool, spec_css
+from metrics import metrics, start_metrics_server
+from output_writer import OutputWriter, create_sinks
+from product_store import ProductStore, StoreSink
+from run_journal import RunJournal, JournalSink
 from selenium.webdriver import Remote
-from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+from config import (
+    SELENIUM_SERVERS,
+    WAITROSE_GRAPHQL_URL,
+    WAITROSE_PRODUCTS_URL,
+    LISTING_CONCURRENCY,
+    LISTING_PAGE_SIZE,
+    LISTING_RETRIES,
+    LISTING_BACKOFF,
+    HTTP_ENABLED,
+    HTTP_CONCURRENCY,
+    HTTP_TIMEOUT,
+    HTTP_RETRIES,
+    SELENIUM_SERVER_CAPACITIES,
+    SESSION_MAX_PAGES,
+    SESSION_PAGE_LOAD_TIMEOUT,
+    SESSION_WAIT_TIMEOUT,
+    SCHEDULER_MAX_ATTEMPTS,
+    SCHEDULER_UNHEALTHY_AFTER,
+    OUTPUT_FORMATS,
+    OUTPUT_PATH,
+    OUTPUT_PRICES_PATH,
+    OUTPUT_BATCH_SIZE,
+    OUTPUT_FLUSH_INTERVAL,
+    STORE_PATH,
+    STORE_TTL_HOURS,
+    STORE_OUTPUT,
+    JOURNAL_PATH,
+    CRAWL_ROOT_CATEGORIES,
+    PARSER_WORKERS,
+    METRICS_SUMMARY_PATH,
+    METRICS_PRICES_SUMMARY_PATH,
+    METRICS_PORT,
+    METRICS_HOST
+)
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+# The browser waits for any description section or a rendered nutrition table
+PRODUCT_SECTIONS_SELECTOR = f"{spec_css('description')}, {spec_css('nutrition', ' table')}"
 
 class ProductScraper:
-    _sbr_connection: ChromiumRemoteConnection
+    _session_pools: List[SessionPool]
+    _writer: OutputWriter
+    _parser: Optional[ParserPool]
     _products: List[any]
     
-    def __init__(self, products: List[any], sbr_connection: ChromiumRemoteConnection) -> None:
+    def __init__(self, products: List[any], writer: OutputWriter, parser: Optional[ParserPool] = None, session_pools: Optional[List[SessionPool]] = None) -> None:
         self._products = products
-        self._sbr_connection = sbr_connection
+        self._writer = writer
+        self._parser = parser
+        self._session_pools = session_pools or []
         
-    def get_product_page_link(self, product_name: str, product_id: str) -> str:
-        BASE_URL = "https://www.waitrose.com/ecom/products"
+    @staticmethod
+    def get_product_page_link(product_name: str, product_id: str) -> str:
+        BASE_URL = WAITROSE_PRODUCTS_URL
         normalized_string = product_name.lower().replace("&", "").strip()
         slug = re.sub(r'[-_\s]+', '-', normalized_string)
         return f"{BASE_URL}/{slug}/{product_id}"
 
-    def scrape_products(self):
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument("--start-maximized")
-        for product in self._products:
+    def parse_product(self, product: Dict[str, any], fields: Dict[str, any]) -> Dict[str, any]:
+        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        source = "Waitrose"
+        title = product["name"]
+        description = fields["description"]
+        item_price = product["displayPrice"]
+        unit_price = product["displayPriceQualifier"]
+        if unit_price is None: unit_price = item_price
+        average_rating = product["reviews"]["averageRating"]
+        review_count = product["reviews"]["reviewCount"]
+        categories = ','.join([category["name"] for category in product["categories"]])
+        tags = ','.join([tag["name"] for tag in product["productTags"]] if product["productTags"] else [])
+        product_url = self.get_product_page_link(product["name"], product["id"])
+        image_url = product["productImageUrls"]["large"]
+        size = product["size"]
+        nutritions = fields["nutrition"]
+        
+        return {
+            'id': product["id"],
+            'source': source,
+            'title': title, 
+            'description': description,
+            'item_price': item_price,
+            'unit_price': unit_price,
+            'average_rating': average_rating,
+            'review_count': review_count,
+            'categories': categories,
+            'tags': tags,
+            'nutrition': nutritions,
+            'product_url': product_url,
+            'image_url': image_url,
+            'size': size,
+            'last_updated': now 
+        }
+
+    def write_product(self, row: Dict[str, any]) -> None:
+        logging.debug(row)
+        self._writer.write(row)
+
+    def scrape_products_http(self, fetcher: ProductPageFetcher) -> List[any]:
+        # Returns the products whose pages still need a browser
+        fallback_products = []
+        products_by_url = {self.get_product_page_link(product["name"], product["id"]): product for product in self._products}
+
+        def fallback(product: Dict[str, any]) -> None:
+            metrics.increment("products", node="http", status="fallback")
+            fallback_products.append(product)
+
+        def on_parsed(product: Dict[str, any], fields: Dict[str, any], missing: List[str], error: Optional[Tuple[str, str]]) -> None:
+            # Pages that could not be parsed, rendered without their description, or with
+            # an unreadable nutrition table, have to be rendered in a browser instead
+            if error is not None:
+                logging.info(f"Failed to parse product {product['id']}: {error[0]}: {error[1]}")
+                fallback(product)
+                return
+            if missing:
+                fallback(product)
+                return
             try:
-                with Remote(self._sbr_connection, options=chrome_options) as driver:
-                    product_url = self.get_product_page_link(product["name"], product["id"])
-                    
-                    driver.get(product_url)
-                    
-                    html = driver.page_source
-                    
-                    page = BeautifulSoup(html, "html5lib")
-                    
-                    with open("waitrose_products.csv", 'a', newline='') as csv_file:
-                        fieldnames = [
-                            'source',
-                            'title', 
-                            'description',
-                            'item_price',
-                            'unit_price',
-                            'average_rating',
-                            'review_count',
-                            'categories',
-                            'tags',
-                            'nutrition',
-                            'product_url',
-                            'image_url',
-                            'size',
-                            'last_updated' 
-                        ]
-                        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-                    
-                        if csv_file.tell() == 0:
-                            writer.writeheader()
-                            
-                        now = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-                        source = "Waitrose"
-                        title = product["name"]
-                        
-                        prd_section = page.find('section', id="productDescription")
-                        description = prd_section.get_text(strip=True) if prd_section else None
-                        
-                        if description is None:
-                            summary_section = page.find('section', id="summary")
-                            description = summary_section.get_text(strip=True) if summary_section else ''
-                        
-                        if description is None:
-                            marketing_section_element = page.find('section', id="marketingDescription")
-                            description = marketing_section_element.get_text(strip=True) if marketing_section_element else ''
-                        
-                        item_price = product["displayPrice"]
-                        unit_price = product["displayPriceQualifier"]
-                        if unit_price is None: unit_price = item_price
-                        average_rating = product["reviews"]["averageRating"]
-                        review_count = product["reviews"]["reviewCount"]
-                        categories = ','.join([category["name"] for category in product["categories"]])
-                        tags = ','.join([tag["name"] for tag in product["productTags"]] if product["productTags"] else [])
-                        product_url = product_url
-                        image_url = product["productImageUrls"]["large"]
-                        size = product["size"]
-                        
-                        nutritions = { "values": [] }
-                        
-                        try:
-                            nutrition_element = page.find("div", class_="nutrition___VCHp1")
-                            nutrition_titles = [child.get_text(strip=True) for child in nutrition_element.thead.tr.children]
-                            nutrition_rows = nutrition_element.table.tbody.find_all("tr")
-
-                            for _id, nutrition_title in enumerate(nutrition_titles):
-                              
-                              if _id == 0 : continue
-
-                              nutrition = { "unit" : nutrition_title }
-
-                              for row in nutrition_rows:
-                                if 'class' not in row.th.attrs: 
-                                  nutrition_cells = list(row.children)
-                                  nutrition[nutrition_cells[0].get_text(strip=True)] = nutrition_cells[_id].get_text(strip=True)
-
-                              nutritions["values"].append(nutrition)
-                        except:
-                            nutritions = { "values": [] }
-                        
-                        logging.info({
-                            'source': source,
-                            'title': title, 
-                            'description': description,
-                            'item_price': item_price,
-                            'unit_price': unit_price,
-                            'average_rating': average_rating,
-                            'review_count': review_count,
-                            'categories': categories,
-                            'tags': tags,
-                            'nutrition': json.dumps(nutritions),
-                            'product_url': product_url,
-                            'image_url': image_url,
-                            'size': size,
-                            'last_updated': now 
-                        })
-                    
-                        writer.writerow({
-                            'source': source,
-                            'title': title, 
-                            'description': description,
-                            'item_price': item_price,
-                            'unit_price': unit_price,
-                            'average_rating': average_rating,
-                            'review_count': review_count,
-                            'categories': categories,
-                            'tags': tags,
-                            'nutrition': json.dumps(nutritions),
-                            'product_url': product_url,
-                            'image_url': image_url,
-                            'size': size,
-                            'last_updated': now 
-                        })
-                    
+                row = self.parse_product(product, fields)
             except Exception as e:
-                logging.info(f"Exception: {str(e)}")
+                logging.info(f"Failed to build product {product['id']}: {type(e).__name__}: {str(e)}")
+                fallback(product)
+                return
+            metrics.increment("products", node="http", status="completed")
+            self.write_product(row)
+
+        def on_page(product_url: str, html: Optional[str]) -> Optional[Future]:
+            product = products_by_url[product_url]
+            if html is None:
+                fallback(product)
+                return None
+            # Runs on the fetcher's event loop, which waits on the returned future rather than a parser slot
+            return self._parser.submit(html, lambda fields, missing, error: on_parsed(product, fields, missing, error), bounded=False)
+
+        fetcher.fetch_pages(list(products_by_url.keys()), on_page)
+        self._parser.join()
+
+        return fallback_products
+
+    def scrape_product_page(self, product: Dict[str, any], driver: Remote) -> Future:
+        product_url = self.get_product_page_link(product["name"], product["id"])
+        
+        with metrics.timer("driver_get"):
+            driver.get(product_url)
+            
+            # Eager loading returns at DOMContentLoaded, so wait for the sections we read
+            try:
+                WebDriverWait(driver, SESSION_WAIT_TIMEOUT).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, PRODUCT_SECTIONS_SELECTOR)))
+            except TimeoutException:
+                pass
+        
+        with metrics.timer("page_source"):
+            html = driver.page_source
+        
+        # Parsing happens in the parser processes, so the session is released straight away.
+        # The returned future tells the scheduler whether the product was actually saved
+        scraped = Future()
+        
+        def on_parsed(fields: Dict[str, any], missing: List[str], error: Optional[Tuple[str, str]]) -> None:
+            # The page was already fetched, so nothing failing from here on is the node's fault
+            if error is not None:
+                scraped.set_exception(ProductError(f"{error[0]}: {error[1]}"))
+                return
+            try:
+                self.write_product(self.parse_product(product, fields))
+            except Exception as e:
+                scraped.set_exception(ProductError(f"{type(e).__name__}: {str(e)}"))
+            else:
+                scraped.set_result(None)
+        
+        self._parser.submit(html, on_parsed)
+        return scraped
+
+    def scrape_products(self) -> List[Tuple[Dict[str, any], str]]:
+        scheduler = GridScheduler(
+            self._session_pools,
+            SELENIUM_SERVER_CAPACITIES,
+            self.scrape_product_page,
+            SCHEDULER_MAX_ATTEMPTS,
+            SCHEDULER_UNHEALTHY_AFTER)
+        failures = scheduler.run(self._products)
+        self._parser.join()
+        return failures
                 
     
-def run_waitrose_scraper():
-    logging.info("Waitrose scraper running...")
+def scrape_product_pages(products: List[any], writer: OutputWriter, parser: ParserPool) -> List[Tuple[Dict[str, any], str]]:
+    if HTTP_ENABLED:
+        fetcher = ProductPageFetcher(HTTP_CONCURRENCY, HTTP_TIMEOUT, HTTP_RETRIES)
+        fallback_products = ProductScraper(products, writer, parser).scrape_products_http(fetcher)
+        logging.info(f"{len(fallback_products)} of {len(products)} product pages needed the Selenium fallback")
+        products = fallback_products
     
-    csv_file_name = "waitrose_products.csv"
-    if os.path.exists(csv_file_name):
-        os.remove(csv_file_name)
-            
-    # Get the total count of Waitrose products
-    url = "https://www.waitrose.com/api/graphql-prod/graph/live"
-    payload = {
-        "query": "fragment ProductFragment on Product {\n  availableDays\n  barCodes\n  conflicts {\n    lineNumber\n    messages\n    nextSlotDate\n    outOfStock\n    priority\n    productId\n    prohibitedActions\n    resolutionActions\n    slotOptionDates {\n      type\n      date\n    }\n  }\n  containsAlcohol\n  lineNumber\n  images {\n    extraLarge\n    large\n    medium\n    small\n  }\n  id\n  productType\n  size\n  brand\n  thumbnail\n  name\n  leadTime\n  reviews {\n    averageRating\n    total\n  }\n  customerProductDetails {\n    customerFavourite\n    customerPyo\n  }\n  currentSaleUnitPrice {\n    quantity {\n      amount\n      uom\n    }\n    price {\n      amount\n      currencyCode\n    }\n  }\n  defaultQuantity {\n    amount\n    uom\n  }\n  depositCharge {\n    amount\n    currencyCode\n  }\n  pricing {\n    displayPrice\n    displayUOMPrice\n    displayPriceQualifier\n    displayPriceEstimated\n    formattedPriceRange\n    currentSaleUnitRetailPrice {\n      price {\n        amount\n        currencyCode\n      }\n      quantity {\n        amount\n        uom\n      }\n    }\n    promotions {\n      groups {\n        threshold\n        name\n        lineNumbers\n      }\n      promotionDescription\n      promotionExpiryDate\n      promotionId\n      pyoPromotion\n      myWaitrosePromotion\n      wasDisplayPrice\n      promotionType\n    }\n  }\n  persistDefault\n  markedForDelete\n  substitutionsProhibited\n  displayPrice\n  displayPriceEstimated\n  displayPriceQualifier\n  leadTime\n  productShelfLife\n  maxPersonalisedMessageLength\n  summary\n  supplierOrder\n  restriction {\n    availableDates {\n      restrictionId\n      startDate\n      endDate\n      cutOffDate\n    }\n  }\n  weights {\n    pricePerUomQualifier\n    defaultQuantity {\n      amount\n      uom\n    }\n    servings {\n      min\n      max\n    }\n    sizeDescription\n    uoms\n    formattedWeightRange\n  }\n  categories {\n    id\n    name\n    urlName\n  }\n  productTags {\n    name\n  }\n  marketingBadges {\n    name\n  }\n}\nfragment ProductPod on Product {\n              adTechSponsoredPosition,\n              brand,\n              categories {\n                  name,\n                  urlName,\n                  id\n              },\n              cqResponsive {\n                deviceBreakpoints {\n                  name\n                  visible\n                  width\n                }\n              },\n              currentSaleUnitPrice {\n                price {\n                  amount\n                  currencyCode\n                }\n                quantity {\n                  amount\n                  uom\n                }\n              },\n              customerProductDetails {\n                customerInTrolleyQuantity {\n                  amount\n                  uom\n                }\n                customerPyo\n              },\n              defaultQuantity {\n                  uom\n              },\n              depositCharge {\n                amount,\n                currencyCode\n              },\n              displayPrice,\n              displayPriceEstimated,\n              displayPriceQualifier,\n              formattedWeightRange,\n              formattedPriceRange,\n              id,\n              leadTime,\n              lineNumber\n              maxPersonalisedMessageLength,\n              name,\n              markedForDelete,\n              persistDefault,\n              productImageUrls {\n                  extraLarge,\n                  large,\n                  medium,\n                  small\n              }\n              productType,\n              promotion {\n                groups {\n                  threshold\n                  name\n                  lineNumbers\n                }\n                myWaitrosePromotion\n                promotionDescription\n                promotionId\n                promotionTypeCode\n                wasDisplayPrice\n              },\n              promotions {\n                groups {\n                  threshold\n                  name\n                  lineNumbers\n                }\n                myWaitrosePromotion\n                promotionDescription\n                promotionId\n                promotionTypeCode\n                wasDisplayPrice\n              },\n              restriction {\n                  availableDates {\n                      restrictionId,\n                      startDate,\n                      endDate,\n                      cutOffDate\n                  },\n              },\n              resultType,\n              reviews {\n                averageRating\n                reviewCount\n              },\n              size,\n              sponsored,\n              sponsorshipId,\n              substitutionsProhibited,\n              thumbnail\n              typicalWeight {\n                amount\n                uom\n              }\n              servings {\n                min\n                max\n              }\n              weights {\n                  uoms ,\n                  pricePerUomQualifier,\n                  perUomQualifier,\n                  defaultQuantity {\n                      amount,\n                      uom\n                  },\n                  servings {\n                      max,\n                      min\n                  },\n                  sizeDescription\n              },\n              productTags {\n                name\n              },\n              marketingBadges {\n                name\n              },\n            }query(\n  $customerId: String!\n  $withRecommendations: Boolean!\n  $size: Int\n  $start: Int\n  $category: String\n  $filterTags: [filterTag]\n  $recommendationsSize: Int\n  $recommendationsStart: Int\n  $sortBy: String\n  $trolleyId: String\n  $withFallback: Boolean\n) {\n  getProductListPage(\n    category: $category\n    customerId: $customerId\n    filterTags: $filterTags\n    recommendationsSize: $recommendationsSize\n    recommendationsStart: $recommendationsStart\n    size: $size\n    start: $start\n    sortBy: $sortBy\n    trolleyId: $trolleyId\n    withFallback: $withFallback\n  ) {\n  productGridData {\n      failures{\n          field\n          message\n          type\n      }\n      componentsAndProducts {\n        __typename\n        ... on GridProduct {\n          searchProduct {\n            ...ProductPod\n          }\n        }\n        ... on GridCmsComponent {\n          aemComponent\n        }\n        ... on GridSponsoredBannerComponent {\n          sponsoredBanner\n        }\n      }\n      conflicts {\n        messages\n        outOfStock\n        priority\n        productId\n        prohibitedActions\n        resolutionActions\n        nextSlotDate\n    }\n      criteria {\n        alternative\n        sortBy\n        filters {\n          group\n          filters {\n            applied\n            filterTag {\n              count\n              group\n              id\n              text\n              value\n            }\n          }\n        }\n        searchTags {\n          group\n          text\n          value\n        }\n        suggestedSearchTags {\n          group\n          text\n          value\n        }\n      }\n      locations {\n        header\n        masthead\n        seoContent\n      }\n      metaData {\n        description\n        title\n        keywords\n        turnOffIndexing\n        pageTitle\n        canonicalTag\n      }\n      productsInResultset\n      relevancyWeightings\n      searchTime\n      showPageTitle\n      subCategories {\n        name\n        categoryId\n        expectedResults\n        hiddenInNav\n      }\n      totalMatches\n      totalTime\n    }\n    recommendedProducts @include(if: $withRecommendations) {\n      failures{\n        field\n        message\n        type\n      }\n      fallbackRecommendations\n      products {\n        ...ProductFragment\n        metadata {\n          recToken\n          monetateId\n        }\n      }\n      totalResults\n    }\n  }\n}\n",
-        "variables": {
-            "start": 0,
-            "size": 4,
-            "sortBy": "MOST_POPULAR",
-            "trolleyId": "0",
-            "recommendationsSize": 0,
-            "withRecommendations": False,
-            "withFallback": True,
-            "category": "10051",
-            "customerId": "-1",
-            "filterTags": []
-        }
-    }
-    response = requests.post(url,json=payload, headers={"Authorization": "Bearer unauthenticated"})
-    content = json.loads(response.content)
-    totalMatches = content["data"]["getProductListPage"]["productGridData"]["totalMatches"]
+    if not products:
+        return []
+    
+    if not SELENIUM_SERVERS:
+        logging.info(f"No Selenium Grid servers configured, skipping {len(products)} products")
+        return [(product, "No Selenium Grid servers configured") for product in products]
+    
+    # Each Grid server gets as many reusable browser sessions as its configured capacity
+    session_pools = [
+        SessionPool(SELENIUM_SERVER, SELENIUM_SERVER_CAPACITIES[SELENIUM_SERVER], SESSION_MAX_PAGES, SESSION_PAGE_LOAD_TIMEOUT)
+        for SELENIUM_SERVER in SELENIUM_SERVERS
+    ]
+    
+    try:
+        return ProductScraper(products, writer, parser, session_pools).scrape_products()
+    finally:
+        for session_pool in session_pools:
+            session_pool.close()
+
+def export_products(store: ProductStore, run_started: float, listing_failures: int = 0, path: str = OUTPUT_PATH, seen_at: Optional[float] = None) -> int:
+    # The output is always produced from the store, so unchanged products are still included in a snapshot
+    if STORE_OUTPUT != "delta" and listing_failures:
+        # Products on the unlisted pages would silently drop out of the snapshot
+        logging.info(f"Not exporting a snapshot, the listing is incomplete ({listing_failures} pages failed)")
+        return 0
     
-    start: int = 0
-    size: int = 80
-    request_count = math.ceil(totalMatches / size)
+    changed_since = run_started if STORE_OUTPUT == "delta" else None
+    with OutputWriter(create_sinks(OUTPUT_FORMATS, path), OUTPUT_BATCH_SIZE, OUTPUT_FLUSH_INTERVAL, "export") as exporter:
+        for record in store.iter_records(seen_at or run_started, changed_since):
+            exporter.write(record)
+    return exporter.written
+
+def run_waitrose_scraper(resume: bool = False):
+    logging.info("Waitrose scraper running...")
     
-    products = []
+    metrics.reset()
+    start_metrics_server(METRICS_PORT, METRICS_HOST)
     
-    for _ in tqdm(range(request_count)):
-        response = requests.post(url,json={**payload, "variables": {**payload["variables"], "start": start, "size": size}}, headers={"Authorization": "Bearer unauthenticated"})
-        content = json.loads(response.content)
-        start += size
-        page_products = content["data"]["getProductListPage"]["productGridData"]["componentsAndProducts"]
-        for product in page_products:
-            if product["__typename"] == "GridProduct":
-                products.append(product["searchProduct"])
+    with RunJournal(JOURNAL_PATH) as journal:
+        resumable_run = journal.find_resumable_run() if resume else None
+        
+        if resume and resumable_run is None:
+            logging.info("No interrupted or failed run to resume, starting a new run")
+        
+        if resumable_run is not None:
+            run_id, run_started, listing_failures = resumable_run
+            products, pending_products = journal.load_products(run_id)
+            journal.mark_running(run_id)
+            logging.info(f"Resuming run {run_id}: {len(pending_products)} of {len(products)} products left")
+        else:
+            with ListingFetcher(LISTING_CONCURRENCY, LISTING_PAGE_SIZE, LISTING_RETRIES, LISTING_BACKOFF, WAITROSE_GRAPHQL_URL) as listing_fetcher:
+                products, listing_failures = listing_fetcher.crawl(CRAWL_ROOT_CATEGORIES)
+            
+            logging.info(f"Listed {len(products)} unique products")
+            
+            run_id, run_started = None, time.time()
         
-    process_count = len(SELENIUM_SERVERS) * 2 # Assign two browser sessions per Grid server
+        try:
+            with ProductStore(STORE_PATH) as store:
+                if run_id is None:
+                    pending_products = store.plan(products, STORE_TTL_HOURS * 3600, run_started)
+                    run_id = journal.start_run(products, pending_products, run_started, listing_failures)
+                    seen_at = run_started
+                else:
+                    # The journal's listing snapshot may be older than the store's if a prices
+                    # refresh ran in between, so the store's listings are used as they are
+                    pending_products = store.load_listings([product["id"] for product in pending_products])
+                    seen_at = store.last_listed() or run_started
+                
+                logging.info(f"{len(pending_products)} of {len(products)} product pages need to be fetched")
+                
+                # The journal only marks products completed once the store has saved them
+                with OutputWriter([StoreSink(store), JournalSink(journal, run_id)], OUTPUT_BATCH_SIZE, OUTPUT_FLUSH_INTERVAL) as writer:
+                    with ParserPool(PARSER_WORKERS) as parser:
+                        failures = scrape_product_pages(pending_products, writer, parser)
+                
+                journal.mark_failed(run_id, failures)
+                
+                for product, reason in failures:
+                    logging.info(f"Failed to scrape product {product['id']}: {reason}")
+                
+                exported = export_products(store, run_started, listing_failures, seen_at=seen_at)
+            
+            journal.finish_run(run_id)
+            
+            logging.info(f"Waitrose scraper finished, {writer.written} products scraped, {exported} products exported ({STORE_OUTPUT}), {len(failures)} products failed")
+            
+            if failures:
+                logging.info(f"Run {run_id} has failures, re-queue them with --resume")
+            
+        except Exception as e:
+            logging.info(f"Exception: {str(e)}")
+        finally:
+            try:
+                metrics.write_summary(METRICS_SUMMARY_PATH)
+                logging.info(f"Run metrics written to {METRICS_SUMMARY_PATH}")
+            except Exception as e:
+                logging.info(f"Exception: {str(e)}")
+
+def refresh_waitrose_prices():
+    # Re-lists the catalogue and rebuilds stored records with the new listing fields
+    # (prices, ratings, tags) without fetching any product page
+    logging.info("Waitrose price refresh running...")
     
-    unit = math.ceil(len(products) / process_count)
+    metrics.reset()
+    start_metrics_server(METRICS_PORT, METRICS_HOST)
     
     try:
-        sbr_connections = [ChromiumRemoteConnection(SELENIUM_SERVER, "google", "chrome") for SELENIUM_SERVER in SELENIUM_SERVERS]
+        with ListingFetcher(LISTING_CONCURRENCY, LISTING_PAGE_SIZE, LISTING_RETRIES, LISTING_BACKOFF, WAITROSE_GRAPHQL_URL) as listing_fetcher:
+            products, listing_failures = listing_fetcher.crawl(CRAWL_ROOT_CATEGORIES)
         
-        processes = [
-            mp.Process(target=ProductScraper(products[unit * i :], sbr_connections[i % len(SELENIUM_SERVERS)]).scrape_products)
-            if i == (process_count - 1) else 
-            mp.Process(target=ProductScraper(products[unit * i : unit * (i + 1)], sbr_connections[i % len(SELENIUM_SERVERS)]).scrape_products)
-            for i in range(process_count)
-        ]
-
-        for process in processes:
-            process.start()
-        for process in processes:
-            process.join()
-
-        logging.info("Waitrose scraper finished")
+        logging.info(f"Listed {len(products)} unique products")
+        
+        run_started = time.time()
+        
+        with ProductStore(STORE_PATH) as store:
+            store.plan(products, STORE_TTL_HOURS * 3600, run_started)
+            
+            with OutputWriter([StoreSink(store, scraped=False)], OUTPUT_BATCH_SIZE, OUTPUT_FLUSH_INTERVAL) as writer:
+                scraper = ProductScraper([], writer)
+                for product, record in store.iter_listed_records(run_started):
+                    scraper.write_product(scraper.parse_product(product, record))
+            
+            exported = export_products(store, run_started, listing_failures, OUTPUT_PRICES_PATH)
+        
+        # New products have no record yet, the next full run scrapes them
+        logging.info(f"Waitrose price refresh finished, {writer.written} products refreshed, {exported} products exported ({STORE_OUTPUT}), {len(products) - writer.written} products not yet scraped")
         
     except Exception as e:
         logging.info(f"Exception: {str(e)}")
+    finally:
+        try:
+            metrics.write_summary(METRICS_PRICES_SUMMARY_PATH)
+            logging.info(f"Run metrics written to {METRICS_PRICES_SUMMARY_PATH}")
+        except Exception as e:
+            logging.info(f"Exception: {str(e)}")
 
 if __name__ == '__main__':
-    run_waitrose_scraper()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape Waitrose products")
+    parser.add_argument("--resume", action="store_true", help="carry on from the last interrupted run and re-queue its failures")
+    parser.add_argument("--prices", action="store_true", help="only refresh listing fields (prices) of already scraped products")
+    args = parser.parse_args()
+    
+    logging.basicConfig(format="[%(asctime)s] %(message)s", level=logging.INFO)
+    
+    if args.prices:
+        refresh_waitrose_prices()
+    else:
+        run_waitrose_scraper(resume=args.resume)